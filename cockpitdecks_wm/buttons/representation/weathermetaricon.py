@@ -6,25 +6,32 @@
 # but from external, real services.
 #
 # METAR are usually updated every 30 min at specified times.
-# Algorithm could be updated to take that into account: Update at hours+10 or hours+40
-# if not updated in the last 30 minutes. (Could be cached in file?)
+# Updates are scheduled a few minutes after these times, last METAR of each station
+# is cached in file to avoid fetching it again on restart.
+import os
+import json
 import logging
 import random
+import threading
+import time
 import re
 import math
-from functools import reduce
-from datetime import datetime, timezone, tzinfo
+from collections import namedtuple
+from math import asin, cos, radians, sin, sqrt
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import groupby
+from datetime import date, datetime, timezone, tzinfo
 
 from avwx import Station, Metar, Taf
 from suntime import Sun
 from zoneinfo import ZoneInfo
-from timezonefinder import TimezoneFinder
+from timezonefinder import TimezoneFinderL
 
-# these packages have better summary/description of decoded METAR/TAF
-from metar import Metar as MetarDesc
-import pytaf
+# metar and pytaf packages have better summary/description of decoded METAR/TAF,
+# they are only imported in print() when "nice" summary is requested.
 
-from PIL import Image, ImageDraw
+from PIL import Image, ImageDraw, ImageFont
 
 from cockpitdecks import ICON_SIZE
 from cockpitdecks.resources.iconfonts import (
@@ -58,11 +65,42 @@ WI_PREFIX = "wi_"
 DAY = "day_"
 NIGHT = "night_"
 NIGHT_ALT = "night_alt_"
+WI_DAY = WI_PREFIX + DAY
+WI_NIGHT = WI_PREFIX + NIGHT
+WI_NIGHT_ALT = WI_PREFIX + NIGHT_ALT
 
 KW_CAVOK = "clear"  # Special keyword for CAVOK day or night
 CAVOK_DAY = "wi_day_sunny"
 CAVOK_NIGHT = "wi_night_clear"
 
+EARTH_RADIUS = 6371  # km
+KM_PER_DEGREE = math.pi * EARTH_RADIUS / 180  # along a meridian
+
+PRECIP_RE = re.compile(r"RA|SN|DZ|SG|PE|GR|GS")
+ZULU_RE = re.compile(r"\b(\d{2})(\d{2})(\d{2})Z\b")  # DDHHMMZ
+
+METAR_FETCH_MINUTES = (25, 55)  # Metar are issued at HH:20 and HH:50 UTC, fetch a few minutes later
+METAR_INTERVAL = (1800.0, 3600.0)  # seconds, stations report every 30 or 60 minutes
+METAR_MIN_UPDATE = 300.0  # seconds, minimum delay between two fetches of a station Metar
+MIN_RETRY = 60.0  # seconds, first retry delay after a failed fetch
+MAX_RETRY = 900.0  # seconds, retry delay doubles after each failure up to this value
+
+METAR_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "cockpitdecks_wm", "metar.json")  # {icao: {"raw": raw, "fetched_at": timestamp}}
+_METAR_CACHE: tuple[int, dict] | None = None  # (file mtime, content) of last read
+_METAR_CACHE_LOCK = threading.Lock()  # icons save from render threads
+
+# Metar network fetches run here, rendering never waits for them
+FETCH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="wx-fetch")
+FETCH_SHARE = 60.0  # seconds, icons on the same station share a fetch started less than this ago
+_FETCHES: dict[str, tuple[float, Future]] = {}  # icao: (time.monotonic() at submit, fetch_metar() result)
+_FETCHES_LOCK = threading.Lock()
+
+# TimezoneFinder loads its data when created, create it once, when first needed.
+# Lookup-only TimezoneFinderL is sufficient to decide day or night at an airport.
+# It is not thread safe, icons render from the animation thread and from FETCH_POOL.
+_TF: TimezoneFinderL | None = None
+_TF_LOCK = threading.Lock()  # guards creation and lookups
+
 
 class WI:
     """
@@ -122,7 +160,7 @@ class WI:
             KW_WIND: [0, 21],
         },
         {
-            KW_NAME: "cloudy-gusts",
+            KW_NAME: "cloudy_gusts",
             KW_TAGS: [],
             KW_PRECIP: "",
             KW_VIS: [""],
@@ -138,7 +176,7 @@ class WI:
             KW_WIND: [0, 21],
         },
         {
-            KW_NAME: "rain-wind",
+            KW_NAME: "rain_wind",
             KW_TAGS: [],
             KW_PRECIP: "RA",
             KW_VIS: [""],
@@ -162,7 +200,7 @@ class WI:
             KW_WIND: [0, 63],
         },
         {
-            KW_NAME: "storm-showers",
+            KW_NAME: "storm_showers",
             KW_TAGS: ["TS", "SH"],
             KW_PRECIP: "",
             KW_VIS: [""],
@@ -186,7 +224,7 @@ class WI:
             KW_WIND: [22, 33],
         },
         {
-            KW_NAME: "strong-wind",
+            KW_NAME: "strong_wind",
             KW_TAGS: [],
             KW_PRECIP: "",
             KW_VIS: ["CAVOK", "NCD"],
@@ -210,7 +248,7 @@ class WI:
             KW_WIND: [0, 21],
         },
         {
-            KW_NAME: "cloudy-gusts",
+            KW_NAME: "cloudy_gusts",
             KW_TAGS: [],
             KW_PRECIP: "",
             KW_VIS: [""],
@@ -218,7 +256,7 @@ class WI:
             KW_WIND: [22, 63],
         },
         {
-            KW_NAME: "cloudy-gusts",
+            KW_NAME: "cloudy_gusts",
             KW_TAGS: [],
             KW_PRECIP: "",
             KW_VIS: [""],
@@ -226,7 +264,7 @@ class WI:
             KW_WIND: [22, 63],
         },
         {
-            KW_NAME: "cloudy-windy",
+            KW_NAME: "cloudy_windy",
             KW_TAGS: [],
             KW_PRECIP: "",
             KW_VIS: [""],
@@ -234,7 +272,7 @@ class WI:
             KW_WIND: [22, 63],
         },
         {
-            KW_NAME: "cloudy-windy",
+            KW_NAME: "cloudy_windy",
             KW_TAGS: [],
             KW_PRECIP: "",
             KW_VIS: [""],
@@ -250,7 +288,7 @@ class WI:
             KW_WIND: [0, 21],
         },
         {
-            KW_NAME: "snow-wind",
+            KW_NAME: "snow_wind",
             KW_TAGS: [],
             KW_PRECIP: "SN",
             KW_VIS: [""],
@@ -267,6 +305,72 @@ class WI:
         self.special = special  # 0=none, 1=fog, 2=sandstorm
 
 
+# Empty ("") precip, clouds and visibility in WI.DB mean "any".
+# All literal tokens searched in Metar text
+WI_DB_TOKENS = frozenset(t for item in WI.DB for t in item[KW_TAGS] + [item[KW_PRECIP]] + item[KW_CLOUD] + item[KW_VIS]) - {""}
+# Finds all tokens in a single pass over Metar text. Lookahead so that overlapping tokens are all reported.
+WI_DB_TOKENS_RE = re.compile("(?=(" + "|".join(re.escape(t) for t in sorted(WI_DB_TOKENS, key=len, reverse=True)) + "))")
+# One bit per token, a set of tokens is an int
+WI_DB_TOKEN_BITS = {t: 1 << i for i, t in enumerate(sorted(WI_DB_TOKENS))}
+
+
+def token_mask(tokens) -> int:
+    # Empty string means "any" in WI.DB, it has no bit
+    mask = 0
+    for t in tokens:
+        mask |= WI_DB_TOKEN_BITS.get(t, 0)
+    return mask
+
+
+# WI.DB item with token masks, a 0 mask except for tags means no constraint
+WIItem = namedtuple("WIItem", ["tags", "precip", "clouds", "vis", "wind_min", "wind_max", "name", "precip_name"])
+
+WI_DB_INDEX = [
+    WIItem(
+        tags=token_mask(item[KW_TAGS]),
+        precip=token_mask([item[KW_PRECIP]]),
+        clouds=token_mask(item[KW_CLOUD]),
+        vis=token_mask(item[KW_VIS]),
+        wind_min=item[KW_WIND][0],
+        wind_max=item[KW_WIND][1],
+        name=item[KW_NAME],
+        precip_name=item[KW_PRECIP],
+    )
+    for item in WI.DB
+]
+
+# Distinct wind ranges in WI.DB, items only differ by which of these contain the wind
+WI_DB_WIND_RANGES = sorted({tuple(item[KW_WIND]) for item in WI.DB})
+# (mask of tokens present, wind in each range): matching WI.DB items, filled as encountered
+WI_DB_MATCHES: dict[tuple[int, tuple[bool, ...]], list[WIItem]] = {}
+
+
+def match_weather_items(present: int, wind: float) -> list[WIItem]:
+    """
+    Returns WI.DB items matching tokens present in Metar (token_mask()) and wind speed.
+    Result only depends on tokens present and wind ranges, it is computed once per such key.
+    """
+    key = (present, tuple(wind_min <= wind <= wind_max for wind_min, wind_max in WI_DB_WIND_RANGES))
+    items = WI_DB_MATCHES.get(key)
+    if items is not None:
+        return items
+
+    items = []
+    for item in WI_DB_INDEX:
+        # cheapest and most selective test first
+        if (
+            item.wind_min <= wind <= item.wind_max
+            and item.tags & present == item.tags
+            and (item.precip == 0 or item.precip & present != 0)
+            and (item.clouds == 0 or item.clouds & present != 0)
+            and (item.vis == 0 or item.vis & present != 0)
+        ):
+            items.append(item)
+            logger.debug("findIcon: %s %s", item.name, "<" * 10)
+    WI_DB_MATCHES[key] = items
+    return items
+
+
 def distance(origin, destination):
     """
     Calculate the Haversine distance.
@@ -291,17 +395,185 @@ def distance(origin, destination):
     """
     lat1, lon1 = origin
     lat2, lon2 = destination
-    radius = 6371  # km
-
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat / 2) * math.sin(dlat / 2) + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) * math.sin(dlon / 2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    radius = EARTH_RADIUS
+
+    lat1 = radians(lat1)
+    lat2 = radians(lat2)
+    sin_dlat = sin((lat2 - lat1) * 0.5)
+    sin_dlon = sin(radians(lon2 - lon1) * 0.5)
+    a = sin_dlat * sin_dlat + cos(lat1) * cos(lat2) * sin_dlon * sin_dlon
+    c = 2 * asin(sqrt(min(a, 1.0)))  # same as 2 * atan2(sqrt(a), sqrt(1 - a)), a may exceed 1 by rounding
     d = radius * c
 
     return d
 
 
+def next_metar_delay(min_delay: float) -> float:
+    """
+    Returns seconds until first Metar fetch minute (METAR_FETCH_MINUTES, UTC) at least min_delay seconds from now.
+    """
+    earliest = datetime.now(timezone.utc).timestamp() + min_delay
+    hour = earliest - earliest % 3600
+    slots = [hour + h * 3600 + m * 60 for h in (0, 1) for m in METAR_FETCH_MINUTES]
+    return next(s for s in slots if s >= earliest) - earliest + min_delay
+
+
+def fetch_metar(icao: str) -> Metar:
+    # Runs in FETCH_POOL, returns a new Metar so that the one in use is never partially updated.
+    # Metar may be shared by several icons, they do not modify it.
+    metar = Metar(icao)
+    metar.update()
+    return metar
+
+
+def read_metar_cache() -> dict:
+    # Cache file is only parsed again if it was modified, by this or another process
+    global _METAR_CACHE
+    try:
+        mtime = os.stat(METAR_CACHE_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if _METAR_CACHE is not None and _METAR_CACHE[0] == mtime:
+        return _METAR_CACHE[1]
+    try:
+        with open(METAR_CACHE_PATH) as fp:
+            cache = json.load(fp)
+    except:
+        logger.debug(f"cannot read Metar cache {METAR_CACHE_PATH}", exc_info=True)
+        cache = {}
+    if not isinstance(cache, dict):
+        logger.debug(f"Metar cache {METAR_CACHE_PATH} ignored, not a dictionary")
+        cache = {}
+    _METAR_CACHE = (mtime, cache)
+    return cache
+
+
+def load_cached_metar(icao: str, max_age: float) -> tuple[str, float] | None:
+    """
+    Returns (raw Metar, fetch timestamp) for station from file cache if not older than max_age seconds.
+    """
+    with _METAR_CACHE_LOCK:
+        cached = read_metar_cache().get(icao)
+    # File may have been edited or written by another version, an entry with unexpected content is a cache miss
+    if not isinstance(cached, dict):
+        return None
+    raw = cached.get("raw")
+    fetched_at = cached.get("fetched_at")
+    if not isinstance(raw, str) or not isinstance(fetched_at, (int, float)) or time.time() - fetched_at > max_age:
+        return None
+    return raw, fetched_at
+
+
+def save_cached_metar(icao: str, raw: str):
+    # Only called when Metar changed, ~ twice an hour per station.
+    # File is replaced atomically so that readers never see a partially written file.
+    global _METAR_CACHE
+    with _METAR_CACHE_LOCK:
+        cache = dict(read_metar_cache())
+        cache[icao] = {"raw": raw, "fetched_at": time.time()}
+        tmp_path = f"{METAR_CACHE_PATH}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(METAR_CACHE_PATH), exist_ok=True)
+            with open(tmp_path, "w") as fp:
+                json.dump(cache, fp)
+            os.replace(tmp_path, METAR_CACHE_PATH)
+            _METAR_CACHE = (os.stat(METAR_CACHE_PATH).st_mtime_ns, cache)
+        except:
+            logger.warning(f"cannot write Metar cache {METAR_CACHE_PATH}", exc_info=True)
+
+
+@lru_cache(maxsize=256)
+def sun_hours(lat: float, lon: float, day: date) -> tuple[int, int]:
+    """
+    Returns sunrise and sunset hours (UTC) at location on day.
+    Date is part of the key, so entries of previous days simply age out.
+    """
+    sun = Sun(lat, lon)
+    moment = datetime(day.year, day.month, day.day, 12)
+    return sun.get_sunrise_time(moment).hour, sun.get_sunset_time(moment).hour
+
+
+@lru_cache(maxsize=512)
+def station_from_icao(icao: str) -> Station:
+    # Stations do not change, same ICAO is looked up in avwx station database once
+    return Station.from_icao(icao)
+
+
+def shared_fetch(icao: str) -> Future:
+    """
+    Returns a fetch_metar() future for station, shared by all icons on that station.
+    A running fetch, or a successful one started less than FETCH_SHARE seconds ago, is reused.
+    """
+    with _FETCHES_LOCK:
+        fetch = _FETCHES.get(icao)
+        if fetch is not None:
+            started, future = fetch
+            if not future.done() or (time.monotonic() - started < FETCH_SHARE and future.exception() is None):
+                return future
+        future = FETCH_POOL.submit(fetch_metar, icao)
+        _FETCHES[icao] = (time.monotonic(), future)
+        return future
+
+
+def get_tzf() -> TimezoneFinderL:
+    # Called with _TF_LOCK held
+    global _TF
+    if _TF is None:
+        _TF = TimezoneFinderL()  # in_memory is ignored by the L finder, and removed in timezonefinder 9
+    return _TF
+
+
+@lru_cache(maxsize=512)
+def cached_timezone(lng: float, lat: float) -> tzinfo:
+    """
+    Returns timezone at (lng, lat), UTC if none found.
+    Coordinates should be rounded by caller (0.01° ~ 1km) to avoid cache misses.
+    """
+    with _TF_LOCK:
+        tzname = get_tzf().timezone_at(lng=lng, lat=lat)
+    if tzname is not None:
+        logger.debug(f"timezone is {tzname}")
+        return ZoneInfo(tzname)
+    logger.debug(f"no timezone, using utc")
+    return timezone.utc
+
+
+def weather_icon_variants() -> dict:
+    """
+    Resolves day and night variants of all weather icons once.
+
+    Returns a dict keyed by icon base name (without wi_, day_, night_ prefix)
+    with {True: day variant name, False: night variant name}.
+    Night prefers night, then night-alt variants; both fall back to
+    day variant, then to first existing of bare, day, night, night-alt name.
+    """
+    bases = set()
+    for name in WEATHER_ICONS:
+        if not name.startswith(WI_PREFIX):
+            continue
+        base = name[len(WI_PREFIX) :]
+        for prefix in [NIGHT_ALT, NIGHT, DAY]:  # night_alt_ before night_
+            if base.startswith(prefix):
+                base = base[len(prefix) :]
+                break
+        bases.add(base)
+
+    variants = {}
+    for base in bases:
+        bare, day, night, night_alt = (f"{WI_PREFIX}{base}", f"{WI_DAY}{base}", f"{WI_NIGHT}{base}", f"{WI_NIGHT_ALT}{base}")
+        dft_name = next((n for n in (bare, day, night, night_alt) if n in WEATHER_ICONS), None)
+        if dft_name is None:
+            continue
+        day_name = day if day in WEATHER_ICONS else dft_name
+        night_name = next((n for n in (night, night_alt) if n in WEATHER_ICONS), day_name)
+        variants[base] = {True: day_name, False: night_name}
+    return variants
+
+
+WEATHER_ICON_VARIANTS = weather_icon_variants()
+WEATHER_ICON_VALUES = tuple(WEATHER_ICONS.values())  # for random selection
+
+
 class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
     """
     Depends on avwx-engine
@@ -332,22 +604,43 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
             button._config["animation"] = {}
             self.weather = {}
 
-        self._last_updated: datetime | None = None
+        self._last_updated: datetime | None = None  # for display only
+        self._last_updated_mono: float | None = None  # time.monotonic() of last fetch, for elapsed time checks
+        self._next_update_at: float | None = None  # time.monotonic() of next scheduled fetch
+        self._retry_delay = 0.0  # seconds, current backoff after failed fetches, 0 if last fetch succeeded
+        self._fetch: tuple[str, Future] | None = None  # (icao, pending fetch_metar() result)
+        self._metar_ready = False  # set by metar_fetched() when pending fetch completes, see get_image_for_icon()
+        self._metar_issued: datetime | None = None  # issue time of current Metar
+        self._metar_interval = METAR_INTERVAL[0]  # seconds between last two Metar issues of station
         self._cache = None
-        self._busy_updating = False  # need this for race condition during update (anim loop)
+        self._cache_hash: int | None = None  # hash of (metar raw, weather icon) rendered in _cache
+        self._update_lock = threading.Lock()  # need this for race condition during update (anim loop)
 
         refresh_location = self.weather.get("refresh-location", self.CHECK_STATION)  # minutes
         WeatherMetarIcon.MIN_UPDATE = int(refresh_location) * 60
 
         # Working variables
         self.station: Station | None = None
+        self._station_trig: tuple | None = None  # see station_trigonometry()
         self.sun: Sun | None = None
 
         self.metar: Metar | None = None
         self.taf: Taf | None = None
+        self._taf_fetch: Future | None = None  # pending print_forecast(), one at a time
+        # Parts of Metar raw text, split once per Metar, see parse_metar()
+        self._metar_parsed_raw: str | None = None
+        self._metar_body: str = ""  # raw text after ICAO DDHHMMZ
+        self._metar_utc_hm: tuple[int, int] | None = None  # Metar (hours, minutes) zulu time
+        self._metar_tokens = 0  # mask of WI.DB tokens present in Metar body, see token_mask()
+        self._metar_wind = 0  # Metar wind speed, 0 if not reported
         self.show = self.weather.get("summary")
 
         self.weather_icon: str | None = None
+        self._icon_cache: dict[tuple[str | None, bool], str] = {}  # (metar raw, day): weather icon
+        self._icon_text: tuple[str | None, tuple[str, str]] | None = None  # (weather icon, (icon name, icon font character)), see get_icon_text()
+        self._background: tuple[tuple, Image.Image] | None = None  # ((texture, color), cockpit background)
+        self._fonts: dict[tuple[str, int], ImageFont.FreeTypeFont] = {}  # (font name, size): font, see get_cached_font()
+        self._glyph_cache: dict[tuple, Image.Image] = {}  # (icon text, font, size, color): transparent image with icon glyph only
         self.update_position = False
 
         self.icao_dataref_path = button._config.get("string-dataref")
@@ -388,7 +681,7 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
             icao = WeatherMetarIcon.DEFAULT_STATION  # start with default position
             logger.debug(f"default station installed {icao}")
             self.update_position = True  # will be updated
-        self.station = Station.from_icao(icao)
+        self.station = station_from_icao(icao)
         if self.station is not None:
             self.sun = Sun(self.station.latitude, self.station.longitude)
             self.button._config["label"] = icao
@@ -443,27 +736,31 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
         if data.name != self.icao_dataref_path:
             return
         icao = data.value()
-        if icao is None or icao == "":  # no new station, stick or current
+        if icao is None:  # no new station, stick or current
             return
-        if self.station is not None and icao == self.station.icao:  # same station
+        icao = icao.strip().upper()  # string datarefs may be padded, same station must compare equal
+        if icao == "":
             return
-        self.station = Station.from_icao(icao)
-        if self.station is not None:
-            self.sun = Sun(self.station.latitude, self.station.longitude)
-        self.button._config["label"] = icao
+        # make_image() may be running in animation or fetch thread, wait for it before changing station
+        with self._update_lock:
+            if self.station is not None and icao == self.station.icao:  # same station
+                return
+            self.station = station_from_icao(icao)
+            if self.station is not None:
+                self.sun = Sun(self.station.latitude, self.station.longitude)
+            self.button._config["label"] = icao
 
-        # invalidate previous values
-        self.metar = None
-        self._cache = None
-        self.update(force=True)
+            # invalidate previous values
+            self.metar = None
+            self._cache = None
+            self.update(force=True)
 
     def get_station(self):
         if not self.update_position:
             return None
 
-        if self._last_updated is not None and not self.at_default_station():
-            now = datetime.now()
-            diff = now.timestamp() - self._last_updated.timestamp()
+        if self._last_updated_mono is not None and not self.at_default_station():
+            diff = self.since_last_update()
             if diff < WeatherMetarIcon.MIN_UPDATE:
                 logger.debug(f"updated less than {WeatherMetarIcon.MIN_UPDATE} secs. ago ({diff}), skipping update.. ({self.speed})")
                 return None
@@ -480,7 +777,7 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
             if self.station is None:  # If no station, attempt to suggest the default one if we find it
                 icao = self.weather.get("station", WeatherMetarIcon.DEFAULT_STATION)
                 logger.warning(f"no station, getting default {icao}")
-                return Station.from_icao(icao)
+                return station_from_icao(icao)
             return None
 
         logger.debug(f"closest station to lat={lat},lon={lon}")
@@ -489,23 +786,139 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
         ## compute distance and require minimum displacment
         dist = 0.0
         if self.station is not None:
-            dist = distance((self.station.latitude, self.station.longitude), (lat, lon))
-            logger.info(f"moved={round(dist,3)}")
-            if dist > self.MIN_DISTANCE_MOVE_KM:
-                self._moved = True
+            if self.near_station(lat, lon):
+                logger.debug(f"moved less than {self.MIN_DISTANCE_MOVE_KM}km")
+            else:
+                dist = self.distance_from_station(lat, lon)
+                logger.info(f"moved={round(dist,3)}")
+                if dist > self.MIN_DISTANCE_MOVE_KM:
+                    self._moved = True
         else:
             logger.debug("no station")
         return nearest
 
+    def station_trigonometry(self) -> tuple:
+        # Station values only change with station, they are computed once per station:
+        # (station, lat and lon in radians, cos(lat), max lat and lon difference in degrees inside minimum displacement)
+        if self._station_trig is None or self._station_trig[0] is not self.station:
+            station_lat = math.radians(self.station.latitude)
+            cos_lat = math.cos(station_lat)
+            half_side = self.MIN_DISTANCE_MOVE_KM / math.sqrt(2) / KM_PER_DEGREE  # square inscribed in minimum displacement circle
+            self._station_trig = (
+                self.station,
+                station_lat,
+                math.radians(self.station.longitude),
+                cos_lat,
+                half_side,
+                half_side / max(cos_lat, 1e-6),
+            )
+        return self._station_trig
+
+    def near_station(self, lat: float, lon: float) -> bool:
+        # Cheap test before haversine: True if (lat, lon) is surely within MIN_DISTANCE_MOVE_KM of current station
+        dlat_max, dlon_max = self.station_trigonometry()[4:]
+        return abs(lat - self.station.latitude) <= dlat_max and abs(lon - self.station.longitude) <= dlon_max
+
+    def distance_from_station(self, lat: float, lon: float) -> float:
+        # Haversine distance in km from current station to (lat, lon)
+        _, lat1, lon1, cos_lat1, _, _ = self.station_trigonometry()
+        lat2 = radians(lat)
+        sin_dlat = sin((lat2 - lat1) * 0.5)
+        sin_dlon = sin((radians(lon) - lon1) * 0.5)
+        a = sin_dlat * sin_dlat + cos_lat1 * cos(lat2) * sin_dlon * sin_dlon
+        return 2 * EARTH_RADIUS * asin(sqrt(min(a, 1.0)))
+
     def update_metar(self, create: bool = False):
+        # Starts a background fetch when needed, the Metar is replaced on a later call when the fetch has completed
         if create:
             self.metar = Metar(self.station.icao)
+            self._icon_cache = {}
+            self._fetch = None  # fetch for previous station is ignored
+            self.taf = None
+            self._taf_fetch = None  # forecast of previous station is still printed, labelled with its station
+            self._metar_issued = None
+            self._metar_interval = METAR_INTERVAL[0]
+            cached = load_cached_metar(self.station.icao, METAR_INTERVAL[0])  # newer report may be out after that
+            if cached is not None:
+                raw, fetched_at = cached
+                try:
+                    self.metar.parse(raw)
+                except:
+                    logger.warning(f"station {self.station.icao}, cached Metar ignored", exc_info=True)
+                    self.metar = Metar(self.station.icao)  # not partially parsed, fetched as if no cache
+                    cached = None
+            if cached is not None:
+                age = time.time() - fetched_at
+                self._last_updated = datetime.fromtimestamp(fetched_at)
+                self._last_updated_mono = time.monotonic() - age
+                # Next fetch is scheduled from report issue time, as after a fetch, a report already due is fetched now
+                issued = getattr(getattr(self.metar.data, "time", None), "dt", None)
+                if issued is not None and time.time() >= issued.timestamp() + METAR_INTERVAL[0]:
+                    self._metar_issued = issued
+                    self._next_update_at = None
+                else:
+                    self._next_update_at = time.monotonic() + self.next_update_delay()
+                logger.info(f"station {self.station.icao}, Metar loaded from cache ({round(age)} secs. old)")
+        if self._fetch is not None:
+            return self.collect_metar()
         if not self.needs_update():
             return False
+        icao = self.station.icao
+        future = shared_fetch(icao)
+        self._fetch = (icao, future)
+        if future.done():  # shared fetch already completed, collect it now
+            return self.collect_metar()
+        future.add_done_callback(self.metar_fetched)
+        logger.debug(f"station {icao}, Metar fetch started")
+        return False
+
+    def next_update_delay(self) -> float:
+        # Next Metar of station is not expected before last issue time + station reporting interval
+        min_delay = METAR_MIN_UPDATE  # not MIN_UPDATE, the location refresh period, longer than half-hourly reports
+        issued = getattr(getattr(self.metar.data, "time", None), "dt", None)
+        if issued is None:
+            return next_metar_delay(min_delay)
+        if self._metar_issued is not None and issued > self._metar_issued:
+            interval = (issued - self._metar_issued).total_seconds()
+            self._metar_interval = min(max(interval, METAR_INTERVAL[0]), METAR_INTERVAL[1])
+        self._metar_issued = issued
+        expected = issued.timestamp() + self._metar_interval - time.time()
+        return next_metar_delay(max(min_delay, expected))
+
+    def metar_fetched(self, future: Future):
+        # Called in fetch thread, render again to collect the new Metar.
+        # If a render is in progress, it sees the flag and renders again when done, see get_image_for_icon().
+        self._metar_ready = True
+        if self._inited and self.button.on_current_page():
+            self.button.render()
+
+    def collect_metar(self) -> bool:
+        icao, future = self._fetch
+        if not future.done():
+            return False
+        self._fetch = None
+        if icao != self.station.icao:
+            return False
+        try:
+            metar = future.result()
+        except:
+            # Current Metar, if any, is kept and still rendered until a fetch succeeds
+            self._retry_delay = min(2 * self._retry_delay, MAX_RETRY) if self._retry_delay > 0 else MIN_RETRY
+            self._next_update_at = time.monotonic() + self._retry_delay
+            logger.warning(f"station {icao}, Metar fetch failed, retry in {self._retry_delay} secs.", exc_info=True)
+            return False
         before = self.metar.raw
-        updated = self.metar.update()
+        updated = metar.raw != before
+        if updated:
+            self.metar = metar
+        self._retry_delay = 0.0
         self._last_updated = datetime.now()
+        self._last_updated_mono = time.monotonic()
+        self._next_update_at = self._last_updated_mono + self.next_update_delay()
         if updated:
+            self._icon_cache = {}
+            if self.metar.raw is not None:
+                save_cached_metar(icao, self.metar.raw)
             logger.info(f"station {self.station.icao}, Metar updated")
             logger.info(f"update: {before} -> {self.metar.raw}")
             if self.show is not None:
@@ -515,35 +928,49 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
         return updated
 
     def print(self):
-        # Print current situation
-        if self.has_metar("raw") and self.show == "nice":
-            obs = MetarDesc.Metar(self.metar.raw)
-            logger.info(f"Current:\n{obs.string()}")
-        elif self.has_metar("summary"):
-            logger.info(f"Current:\n{'\n'.join(self.metar.summary.split(','))}")
-
-        # Print forecast
-        taf = Taf(self.station.icao)
-        if taf is not None:
+        # Print current situation, python-metar is strict and rejects many real reports,
+        # a Metar that cannot be decoded is only reported, it must not discard the new Metar (called from collect_metar())
+        try:
+            if self.has_metar("raw") and self.show == "nice":
+                from metar import Metar as MetarDesc
+
+                obs = MetarDesc.Metar(self.metar.raw)
+                logger.info(f"Current:\n{obs.string()}")
+            elif self.has_metar("summary"):
+                logger.info(f"Current:\n{'\n'.join(self.metar.summary.split(','))}")
+        except:
+            logger.warning(f"station {self.station.icao}: Metar not printed ({self.metar.raw})", exc_info=True)
+
+        # Forecast is fetched from avwx, it is printed from FETCH_POOL so that rendering does not wait for it
+        if self.taf is None:
+            self.taf = Taf(self.station.icao)
+        if self._taf_fetch is None or self._taf_fetch.done():
+            self._taf_fetch = FETCH_POOL.submit(self.print_forecast, self.station.icao, self.taf)
+
+    def print_forecast(self, icao: str, taf: Taf):
+        # Runs in FETCH_POOL. Taf is kept for the station, update() is True only when it changed, so it is decoded once.
+        # A Taf that cannot be fetched or decoded is only reported.
+        try:
             taf_updated = taf.update()
-            if taf_updated and hasattr(taf, "summary"):
+            if taf_updated and taf.data is not None:  # summary and speech are derived from data
                 if self.show == "nice":
+                    import pytaf
+
                     taf_text = pytaf.Decoder(pytaf.TAF(taf.raw)).decode_taf()
-                    # Split TAF in blocks of forecasts
-                    forecast = []
-                    prevision = []
-                    for line in taf_text.split("\n"):
-                        if len(line.strip()) > 0:
-                            prevision.append(line)
-                        else:
-                            forecast.append(prevision)
-                            prevision = []
+                    # Split TAF in blocks of forecasts, separated by blank lines
+                    forecast = ["\n".join(block) for blank, block in groupby(taf_text.splitlines(), key=lambda line: len(line.strip()) == 0) if not blank]
                     # logger.info(f"Forecast:\n{taf_text}")
-                    logger.info(f"Forecast:\n{'\n'.join(['\n'.join(t) for t in forecast])}")
+                    logger.info(f"Forecast:\n{'\n'.join(forecast)}")
                 else:
                     logger.info(f"Forecast:\n{'\n'.join(taf.speech.split('.'))}")
+        except:
+            logger.warning(f"station {icao}: Taf not printed ({taf.raw})", exc_info=True)
 
     def needs_update(self) -> bool:
+        # 0. Waiting after a failed fetch
+        if self._retry_delay > 0 and time.monotonic() < self._next_update_at:
+            logger.debug(f"backing off")
+            return False
         # 1. No metar
         if self.metar is None:
             logger.debug(f"no metar")
@@ -551,17 +978,21 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
         if self.metar.raw is None:
             logger.debug(f"no updated metar")
             return True
-        # 2. METAR older that 30min
-        if self._last_updated is None:
+        # 2. Next Metar expected
+        if self._next_update_at is None:
             logger.debug(f"never updated")
             return True
-        now = datetime.now()
-        diff = now.timestamp() - self._last_updated.timestamp()
-        if diff > WeatherMetarIcon.MIN_UPDATE:
+        if time.monotonic() >= self._next_update_at:
             logger.debug(f"expired")
             return True
         return False
 
+    def since_last_update(self) -> float | None:
+        # Seconds elapsed since last Metar fetch, None if never fetched
+        if self._last_updated_mono is None:
+            return None
+        return time.monotonic() - self._last_updated_mono
+
     def update(self, force: bool = False) -> bool:
         """
         Creates or updates Metar. Call to avwx may fail, so it is wrapped into try/except block
@@ -577,6 +1008,9 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
         updated = False
         if force:
             self._last_updated = None
+            self._last_updated_mono = None
+            self._next_update_at = None
+            self._retry_delay = 0.0
 
         new_station = self.get_station()
 
@@ -599,6 +1033,8 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
             try:
                 old_station = self.station.icao
                 self.station = new_station
+                self._next_update_at = None  # new station, do not wait for previous station backoff
+                self._retry_delay = 0.0
                 updated = self.update_metar(create=True)
                 updated = True  # force
                 self.sun = Sun(self.station.latitude, self.station.longitude)
@@ -620,13 +1056,11 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
                 )
         else:
             try:
-                now = datetime.now()
-                if self._last_updated is None:
+                if self._last_updated_mono is None:
                     updated = self.update_metar()
                     logger.debug(f"station {self.station.icao}, Metar collected")
                 else:
-                    diff = now.timestamp() - self._last_updated.timestamp()
-                    if diff > WeatherMetarIcon.MIN_UPDATE:
+                    if self.needs_update():
                         updated = self.update_metar()
                     else:
                         logger.debug(f"station {self.station.icao}, Metar does not need updating (last updated at {self._last_updated})")
@@ -663,47 +1097,39 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
         """
 
         logger.debug(f"updating..")
-        if self._busy_updating:
-            logger.info(f"..updating in progress..")
-            return
-        self._busy_updating = True
-        if not self.update() and self._cache is not None:
+        while True:
+            if not self._update_lock.acquire(blocking=False):
+                logger.info(f"..updating in progress..")
+                return self._cache
+            try:
+                self._metar_ready = False
+                image = self.make_image()
+            finally:
+                self._update_lock.release()
+            # Flag is checked after release: a fetch completed later renders by itself
+            if not self._metar_ready:
+                return image
+            logger.debug(f"..Metar fetched while updating, updating again..")
+
+    def make_image(self):
+        # Updates Metar and renders it, called with update lock held
+        updated = self.update()
+        # Station changes force an update even if Metar is the same, check what is rendered
+        cache_hash = hash((self.metar.raw if self.has_metar() else None, self.weather_icon))
+        if self._cache is not None and (not updated or cache_hash == self._cache_hash):
             logger.debug(f"..not updated, using cache")
-            self._busy_updating = False
             return self._cache
 
-        image = Image.new(mode="RGBA", size=(ICON_SIZE, ICON_SIZE), color=TRANSPARENT_PNG_COLOR)  # annunciator text and leds , color=(0, 0, 0, 0)
-        draw = ImageDraw.Draw(image)
-        inside = round(0.04 * image.width + 0.5)
-
         # Weather Icon
         icon_font = self._config.get("icon-font", WEATHER_ICON_FONT)
-        icon_size = int(image.width / 2)
+        icon_size = int(ICON_SIZE / 2)
         icon_color = self.icon_color
-        font = self.get_font(icon_font, icon_size)
-        inside = round(0.04 * image.width + 0.5)
-        w = image.width / 2
-        h = image.height / 2
         logger.debug(f"weather icon: {self.weather_icon}")
-        icon_text = WEATHER_ICONS.get(self.weather_icon)
-        final_icon = self.weather_icon
-        if icon_text is None:
-            logger.warning(f"weather icon '{self.weather_icon}' not found, using default ({DEFAULT_WEATHER_ICON})")
-            final_icon = DEFAULT_WEATHER_ICON
-            icon_text = WEATHER_ICONS.get(DEFAULT_WEATHER_ICON)
-            if icon_text is None:
-                logger.warning(f"default weather icon {DEFAULT_WEATHER_ICON} not found, using hardcoded default (wi_day_sunny)")
-                final_icon = "wi_day_sunny"
-                icon_text = "\uf00d"
+        final_icon, icon_text = self.get_icon_text()
         logger.info(f"weather icon: {final_icon} ({self.speed})")
-        draw.text(
-            (w, h),
-            text=icon_text,
-            font=font,
-            anchor="mm",
-            align="center",
-            fill=light_off(icon_color, 0.8),
-        )  # (image.width / 2, 15)
+        image = self.get_glyph_layer(icon_text, icon_font, icon_size, icon_color).copy()
+        draw = ImageDraw.Draw(image)
+        inside = round(0.04 * image.width + 0.5)
 
         # Weather Data
         lines = None
@@ -723,7 +1149,7 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
                 text_size = int(image.width / 10)
             if text_color is None:
                 text_color = self.label_color
-            font = self.get_font(text_font, text_size)
+            font = self.get_cached_font(text_font, text_size)
             w = inside
             p = "l"
             a = "left"
@@ -744,22 +1170,77 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
             logger.warning(f"no metar summary ({icao})")
 
         # Paste image on cockpit background and return it.
-        bg = self.button.deck.get_icon_background(
-            name=self.button_name(),
-            width=ICON_SIZE,
-            height=ICON_SIZE,
-            texture_in=self.cockpit_texture,
-            color_in=self.cockpit_color,
-            use_texture=True,
-            who="Weather",
-        )
+        bg = self.get_background().copy()
         bg.alpha_composite(image)
         self._cache = bg
+        self._cache_hash = cache_hash
 
         logger.debug(f"..updated")
-        self._busy_updating = False
         return self._cache
 
+    def get_icon_text(self) -> tuple[str, str]:
+        # Returns (icon name, icon font character) for current weather icon with fallbacks, resolved once per weather icon
+        if self._icon_text is not None and self._icon_text[0] == self.weather_icon:
+            return self._icon_text[1]
+        icon_text = WEATHER_ICONS.get(self.weather_icon)
+        final_icon = self.weather_icon
+        if icon_text is None:
+            logger.warning(f"weather icon '{self.weather_icon}' not found, using default ({DEFAULT_WEATHER_ICON})")
+            final_icon = DEFAULT_WEATHER_ICON
+            icon_text = WEATHER_ICONS.get(DEFAULT_WEATHER_ICON)
+            if icon_text is None:
+                logger.warning(f"default weather icon {DEFAULT_WEATHER_ICON} not found, using hardcoded default (wi_day_sunny)")
+                final_icon = "wi_day_sunny"
+                icon_text = "\uf00d"
+        self._icon_text = (self.weather_icon, (final_icon, icon_text))
+        return self._icon_text[1]
+
+    def get_background(self) -> Image.Image:
+        # Cockpit background only changes with texture or color, it is requested once and copied
+        key = (self.cockpit_texture, str(self.cockpit_color))
+        if self._background is None or self._background[0] != key:
+            bg = self.button.deck.get_icon_background(
+                name=self.button_name(),
+                width=ICON_SIZE,
+                height=ICON_SIZE,
+                texture_in=self.cockpit_texture,
+                color_in=self.cockpit_color,
+                use_texture=True,
+                who="Weather",
+            )
+            self._background = (key, bg)
+        return self._background[1]
+
+    def get_cached_font(self, font_name: str, font_size: int):
+        # Only a couple of fonts are used, resolve them once
+        key = (font_name, font_size)
+        font = self._fonts.get(key)
+        if font is None:
+            font = self.get_font(font_name, font_size)
+            self._fonts[key] = font
+        return font
+
+    def get_glyph_layer(self, icon_text: str, icon_font: str, icon_size: int, icon_color) -> Image.Image:
+        # Font rendering of the icon glyph only changes with the icon, layer is rendered once and copied
+        key = (icon_text, icon_font, icon_size, str(icon_color))
+        layer = self._glyph_cache.get(key)
+        if layer is not None:
+            return layer
+        layer = Image.new(mode="RGBA", size=(ICON_SIZE, ICON_SIZE), color=TRANSPARENT_PNG_COLOR)  # annunciator text and leds , color=(0, 0, 0, 0)
+        draw = ImageDraw.Draw(layer)
+        draw.text(
+            (layer.width / 2, layer.height / 2),
+            text=icon_text,
+            font=self.get_cached_font(icon_font, icon_size),
+            anchor="mm",
+            align="center",
+            fill=light_off(icon_color, 0.8),
+        )  # (image.width / 2, 15)
+        if len(self._glyph_cache) >= 16:  # only a handful of icons are used for a station
+            self._glyph_cache = {}
+        self._glyph_cache[key] = layer
+        return layer
+
     def has_metar(self, what: str = "raw"):
         if what == "summary":
             return self.metar is not None and self.metar.summary is not None
@@ -767,24 +1248,52 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
             return self.metar is not None and self.metar.data is not None
         return self.metar is not None and self.metar.raw is not None
 
+    def parse_metar(self):
+        # Splits Metar raw text once, parts are reused until Metar changes
+        raw = self.metar.raw
+        if raw == self._metar_parsed_raw:
+            return
+        self._metar_parsed_raw = raw
+        zulu = ZULU_RE.search(raw)
+        if zulu is None:
+            logger.warning(f"no zulu? {raw}")
+            self._metar_body = raw[13:]  # strip ICAO DDHHMMZ
+            self._metar_utc_hm = None
+        else:
+            logger.debug("zulu %s", zulu.group(0))
+            self._metar_body = raw[zulu.end() :].lstrip()  # strip ICAO DDHHMMZ
+            self._metar_utc_hm = (int(zulu.group(2)), int(zulu.group(3)))
+        # Search each WI.DB token once
+        self._metar_tokens = token_mask(WI_DB_TOKENS_RE.findall(self._metar_body))
+        wind_speed = getattr(self.metar.data, "wind_speed", None)  # no data if Metar could not be parsed, no speed if not reported
+        self._metar_wind = wind_speed.value if wind_speed is not None and wind_speed.value is not None else 0
+
     def is_metar_day(self, sunrise: int = 6, sunset: int = 18) -> bool:
         if not self.has_metar():
             logger.debug("no metar, assuming day")
             return True
-        time = self.metar.raw[7:12]
-        logger.debug(f"zulu {time}")
-        if time[-1] != "Z":
-            logger.warning(f"no zulu? {time}")
+        self.parse_metar()
+        if self._metar_utc_hm is None:
             return True
+        hours, minutes = self._metar_utc_hm
         tz = self.get_timezone()
-        logger.debug(f"timezone {'UTC' if tz == timezone.utc else tz.key}")
+        logger.debug("timezone %s", tz)
         utc = datetime.now(timezone.utc)
-        utc = utc.replace(hour=int(time[0:2]), minute=int(time[2:4]))
+        utc = utc.replace(hour=hours, minute=minutes)
         local = utc.astimezone(tz=tz)
         sun = self.get_sun(local)
         day = local.hour > sun[0] and local.hour < sun[1]
         logger.info(
-            f"metar: {time}, local: {local.strftime('%H%M')} {tz} ({local.utcoffset()}), {'day' if day else 'night'} (sunrise {sun[0]}, sunset {sun[1]})"
+            "metar: %02d%02dZ, local: %02d%02d %s (%s), %s (sunrise %s, sunset %s)",
+            hours,
+            minutes,
+            local.hour,
+            local.minute,
+            tz,
+            local.utcoffset(),
+            "day" if day else "night",
+            sun[0],
+            sun[1],
         )
         return day
 
@@ -792,188 +1301,86 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
         # Uses the simulator local time
         hours = self.button.get_simulator_data_value("sim/cockpit2/clock_timer/local_time_hours", default=12)
         if self.sun is not None:
-            sr = self.sun.get_sunrise_time()
-            ss = self.sun.get_sunset_time()
+            sr, ss = self.get_sun()  # today's hours, cached
         else:
             sr = sunrise
             ss = sunset
         return hours >= sr and hours <= ss
 
     def get_timezone(self):
-        # pip install timezonefinder
-        # from zoneinfo import ZoneInfo
-        # from timezonefinder import TimezoneFinder
-        #
-        tf = TimezoneFinder()
-        tzname = tf.timezone_at(lng=self.station.longitude, lat=self.station.latitude)
-        if tzname is not None:
-            logger.debug(f"timezone is {tzname}")
-            return ZoneInfo(tzname)
-        logger.debug(f"no timezone, using utc")
-        return timezone.utc
+        return cached_timezone(round(self.station.longitude, 2), round(self.station.latitude, 2))
 
     def get_sunrise_time(self):
-        # pip install timezonefinder
-        # from zoneinfo import ZoneInfo
-        # from timezonefinder import TimezoneFinder
-        #
-        tf = TimezoneFinder()
-        tzname = tf.timezone_at(lng=self.station.longitude, lat=self.station.latitude)
-        if tzname is not None:
-            return ZoneInfo(tzname)
-        return timezone.utc
+        return cached_timezone(round(self.station.longitude, 2), round(self.station.latitude, 2))
 
     def get_sun(self, moment: datetime | None = None):
-        # Returns sunrise and sunset rounded hours (24h)
-        if moment is None:
-            today_sr = self.sun.get_sunrise_time()
-            today_ss = self.sun.get_sunset_time()
-            return (today_sr.hour, today_ss.hour)
-        today_sr = self.sun.get_sunrise_time(moment)
-        today_ss = self.sun.get_sunset_time(moment)
-        return (today_sr.hour, today_ss.hour)
+        # Returns sunrise and sunset rounded hours (24h), computed once per station per day
+        return sun_hours(self.station.latitude, self.station.longitude, moment.date() if moment is not None else date.today())
 
     def day_night(self, icon, day: bool = True):
         # Selects day or night variant of icon
-        logger.debug(f"search {icon}, {day}")
+        logger.debug("search %s, %s", icon, day)
 
         # Special case cavok
         if icon == KW_CAVOK:
-            logger.debug(f"{KW_CAVOK}, {day}")
+            logger.debug("%s, %s", KW_CAVOK, day)
             return CAVOK_DAY if day else CAVOK_NIGHT
 
         # Do we have a variant?
-        icon_np = icon.replace("wi_", "")
-        try_icon = None
-        dft_name = None
-        for prefix in [
-            WI_PREFIX,
-            WI_PREFIX + DAY,
-            WI_PREFIX + NIGHT,
-            WI_PREFIX + NIGHT_ALT,
-        ]:
-            if try_icon is None:
-                dft_name = prefix + icon_np
-                logger.debug(f"trying {dft_name}..")
-                try_icon = WEATHER_ICONS.get(dft_name)
-        if try_icon is None:
-            logger.debug(f"no such icon or variant {icon}")
+        variants = WEATHER_ICON_VARIANTS.get(icon.replace(WI_PREFIX, ""))
+        if variants is None:
+            logger.debug("no such icon or variant %s", icon)
             return DEFAULT_WEATHER_ICON
-        else:
-            logger.debug(f"exists {dft_name}")
-
-        # From now on, we are sure we can find an icon
-        # day
-        if not day:
-            icon_name = WI_PREFIX + NIGHT + icon
-            try_icon = WEATHER_ICONS.get(icon_name)
-            if try_icon is not None:
-                logger.debug(f"exists night {icon_name}")
-                return icon_name
-
-            icon_name = WI_PREFIX + NIGHT_ALT + icon
-            try_icon = WEATHER_ICONS.get(icon_name)
-            if try_icon is not None:
-                logger.debug(f"exists night-alt {try_icon}")
-                return icon_name
-
-        icon_name = WI_PREFIX + DAY + icon
-        try_icon = WEATHER_ICONS.get(icon_name)
-        if try_icon is not None:
-            logger.debug(f"exists day {icon_name}")
-            return icon_name
-
-        logger.debug(f"found {dft_name}")
-        return dft_name
+
+        icon_name = variants[bool(day)]
+        logger.debug("found %s", icon_name)
+        return icon_name
 
     def select_weather_icon(self):
         # Needs improvement
         # Stolen from https://github.com/flybywiresim/efb
+        # Metar only changes every 30 minutes or so, cache result
+        day = self.is_metar_day()
+        key = (self.metar.raw if self.has_metar() else None, day)
+        daynight_icon = self._icon_cache.get(key)
+        if daynight_icon is not None:
+            logger.debug("day/night version: %s: %s (cached)", day, daynight_icon)
+            return daynight_icon
+
         icon = "wi_cloud"
         if self.has_metar():
-            rawtext = self.metar.raw[13:]  # strip ICAO DDHHMMZ
-            logger.debug(f"METAR {rawtext}")
+            self.parse_metar()
+            rawtext = self._metar_body
+            logger.debug("METAR %s", rawtext)
             # Precipitations
-            precip = re.match("RA|SN|DZ|SG|PE|GR|GS", rawtext)
-            if precip is None:
-                precip = []
-            logger.debug(f"PRECIP {precip}")
+            precip = PRECIP_RE.search(rawtext)
+            logger.debug("PRECIP %s", precip)
             # Wind
-            wind = self.metar.data.wind_speed.value if hasattr(self.metar.data, "wind_speed") else 0
-            logger.debug(f"WIND {wind}")
-
-            findIcon = []
-            for item in WI.DB:
-                t1 = reduce(
-                    lambda x, y: x + y,
-                    [rawtext.find(desc) for desc in item[KW_TAGS]],
-                    0,
-                ) == len(item[KW_TAGS])
-                t_precip = (len(item[KW_PRECIP]) == 0) or rawtext.find(item[KW_PRECIP])
-                t_clouds = (
-                    (len(item[KW_CLOUD]) == 0)
-                    or (len(item[KW_CLOUD]) == 1 and item[KW_CLOUD][0] == "")
-                    or (
-                        reduce(
-                            lambda x, y: x + y,
-                            [rawtext.find(cld) for cld in item[KW_CLOUD]],
-                            0,
-                        )
-                        > 0
-                    )
-                )
-                t_wind = wind > item[KW_WIND][0] and wind < item[KW_WIND][1]
-                t_vis = (len(item[KW_VIS]) == 0) or (
-                    reduce(
-                        lambda x, y: x + y,
-                        [rawtext.find(vis) for vis in item[KW_VIS]],
-                        0,
-                    )
-                    > 0
-                )
-                ok = t1 and t_precip and t_clouds and t_wind and t_vis
-                if ok:
-                    findIcon.append(item)
-                logger.debug(f"findIcon: {item[KW_NAME]}, list={t1}, precip={t_precip}, clouds={t_clouds}, wind={t_wind}, vis={t_vis} {('<'*10) if ok else ''}")
-            logger.debug(f"STEP 1 {findIcon}")
-
-            # findIcon = list(filter(lambda item: reduce(lambda x, y: x + y, [rawtext.find(desc) for desc in item[KW_TAGS]], 0) == len(item[KW_TAGS])
-            #                            and ((len(item[KW_PRECIP]) == 0) or rawtext.find(item[KW_PRECIP]))
-            #                            and ((len(item[KW_CLOUD]) == 0) or (len(item[KW_CLOUD]) == 1 and item[KW_CLOUD][0] == "") or (reduce(lambda x, y: x + y, [rawtext.find(cld) for cld in item[KW_CLOUD]], 0) > 0))
-            #                            and (wind > item[KW_WIND][0] and wind < item[KW_WIND][1])
-            #                            and ((len(item[KW_VIS]) == 0) or (reduce(lambda x, y: x + y, [rawtext.find(vis) for vis in item[KW_VIS]], 0) > 0)),
-            #                  WI.DB))
-            # logger.debug(f"STEP 1 {findIcon}")
-
-            l = len(findIcon)
-            if l == 1:
-                icon = findIcon[0]["iconName"]
-            else:
-                if l > 1:
-                    findIcon2 = []
-                    if len(precip) > 0:
-                        findIcon2 = list(
-                            filter(
-                                lambda x: re("RA|SN|DZ|SG|PE|GR|GS").match(x["precip"]),
-                                findIcon,
-                            )
-                        )
-                    else:
-                        findIcon2 = list(filter(lambda x: x["day"] == day, findIcon))
-                    logger.debug(f"STEP 2 {findIcon2}")
-                    if len(findIcon2) > 0:
-                        icon = findIcon2[0]["iconName"]
+            wind = self._metar_wind
+            logger.debug("WIND %s", wind)
+
+            # Match items against tokens present
+            logger.debug("TOKENS %s", bin(self._metar_tokens))
+
+            findIcon = match_weather_items(self._metar_tokens, wind)
+            logger.debug("STEP 1 %s", findIcon)
+
+            # Prefer an item with precipitation if Metar reports some, first match otherwise
+            if len(findIcon) > 0:
+                best = findIcon[0]
+                if precip is not None and len(findIcon) > 1:
+                    best = next((x for x in findIcon if PRECIP_RE.match(x.precip_name)), best)
+                icon = best.name
         else:
-            logger.debug(f"no metar ({self.metar})")
+            logger.debug("no metar (%s)", self.metar)
 
-        logger.debug(f"weather icon {icon}")
-        day = self.is_metar_day()
+        logger.debug("weather icon %s", icon)
         daynight_icon = self.day_night(icon, day)
         if daynight_icon is None:
             logger.warning(f"no icon, using default {DEFAULT_WEATHER_ICON}")
             daynight_icon = DEFAULT_WEATHER_ICON
-        daynight_icon = daynight_icon.replace("-", "_")  # ! Important
-        logger.debug(f"day/night version: {day}: {daynight_icon}")
+        logger.debug("day/night version: %s: %s", day, daynight_icon)
+        self._icon_cache[key] = daynight_icon
         return daynight_icon
 
     def select_random_weather_icon(self):
@@ -982,4 +1389,4 @@ class WeatherMetarIcon(DrawAnimation, SimulatorDataListener):
         # precipitation: type, quantity
         # wind: speed
         # currently random anyway...
-        return random.choice(list(WEATHER_ICONS.values()))
+        return random.choice(WEATHER_ICON_VALUES)